@@ -8,11 +8,19 @@ import threading
 import subprocess
 import shlex
 import base64
+import hashlib
+import re
+import mmap
+import atexit
+import functools
+import itertools
+import queue
+from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor, wait as wait_futures
 from urllib.parse import urlparse
-from datetime import datetime
 from pathlib import Path
 
-from flask import Flask, render_template, request, jsonify, send_from_directory, abort
+from flask import Flask, Response, render_template, request, send_from_directory, abort
 from werkzeug.exceptions import HTTPException
 
 try:
@@ -20,22 +28,40 @@ try:
 except Exception:
     CORS = None
 
+try:
+    import orjson
+except Exception:
+    orjson = None
+
 try:
     import requests
+    from requests.adapters import HTTPAdapter
 except Exception:
     requests = None
 
+try:
+    import ormsgpack
+except Exception:
+    ormsgpack = None
+
+try:
+    from waitress import serve as waitress_serve
+except Exception:
+    waitress_serve = None
+
 # ---------------------------------------------------------------------------
 # Paths and constants
 # ---------------------------------------------------------------------------
 APP_ROOT = Path(__file__).resolve().parent
 DIFF_ROOT = (APP_ROOT / "..").resolve()  # assumes gui is inside DiffRhythm root
 INFER_SCRIPT = DIFF_ROOT / "infer" / "infer.py"
+WORKER_SCRIPT = APP_ROOT / "infer_worker.py"
 DEFAULT_BASE = APP_ROOT / "projects"  # base folder for Claude-like projects
 UPLOADS_DIR = APP_ROOT / "uploads"
 TMP_DIR = APP_ROOT / "tmp"
 CONFIG_PATH = APP_ROOT / "config.json"
 FAVORITES_FILE = APP_ROOT / "favorites.json"
+FAVORITES_PACK = APP_ROOT / "favorites.msgpack"  # faster mirror, kept when ormsgpack is installed
 
 DEFAULT_CONFIG = {
     "repo_id": "ASLP-lab/DiffRhythm-1_2",
@@ -47,6 +73,13 @@ DEFAULT_CONFIG = {
     "cuda_visible_devices": "0",
     "base_dir": str(DEFAULT_BASE),
     "active_project": "Default",
+    # keep DiffRhythm loaded in a long-lived worker (False = one process per job)
+    "persistent_worker": True,
+    # prefix successful job logs with the command line and params (always done on failure)
+    "verbose_logs": False,
+    # dynamic batching: how many queued jobs to drain at once, and how long to wait for them
+    "max_batch_size": 4,
+    "batch_wait_timeout_ms": 50,
     # optional: force a specific python binary
     # "python_bin": "/full/path/to/python"
 }
@@ -66,11 +99,16 @@ def resolve_diff_root(cfg: dict = None) -> Path:
       2) env DIFFRHYTHM_ROOT
       3) APP_ROOT/.. (default heuristic)
       4) Walk up to 4 ancestors from APP_ROOT to find 'infer/infer.py'
+    The result is memoized per (diff_root, DIFFRHYTHM_ROOT) pair.
     """
+    cfg_root = (cfg or {}).get('diff_root') or None
+    return _resolve_diff_root(cfg_root, os.environ.get('DIFFRHYTHM_ROOT'))
+
+@functools.lru_cache(maxsize=8)
+def _resolve_diff_root(cfg_root, env_root) -> Path:
     candidates = []
-    if cfg and cfg.get('diff_root'):
-        candidates.append(Path(cfg['diff_root']).expanduser().resolve())
-    env_root = os.environ.get('DIFFRHYTHM_ROOT')
+    if cfg_root:
+        candidates.append(Path(cfg_root).expanduser().resolve())
     if env_root:
         candidates.append(Path(env_root).expanduser().resolve())
     candidates.append((APP_ROOT / '..').resolve())
@@ -86,6 +124,19 @@ def resolve_diff_root(cfg: dict = None) -> Path:
     return candidates[0] if candidates else (APP_ROOT / '..').resolve()
 
 
+MODEL_DIRS = ['models', 'checkpoints', 'pretrained', 'pretrained_models']
+MODEL_GREP_FILES = ['infer/infer.py', 'README.md']
+_MODEL_FILE_RE = re.compile(r'(DiffRhythm[-_][0-9][._][0-9])', re.I)
+_MODEL_REPO_RE = re.compile(rb'ASLP-lab/(DiffRhythm[-_][0-9][._][0-9])')
+# diff_root -> (mtimes of the scanned dirs/files, discovered list)
+_MODEL_CACHE = {}
+
+def _mtime_or_none(p: Path):
+    try:
+        return os.stat(p).st_mtime_ns
+    except OSError:
+        return None
+
 def discover_models(diff_root: Path) -> list:
     """Heuristically discover available model repo-ids.
     Sources:
@@ -93,55 +144,70 @@ def discover_models(diff_root: Path) -> list:
       - A 'models' or 'checkpoints' directory with names like 'DiffRhythm-*'
       - Grep common files (infer/infer.py, README.md) for 'ASLP-lab/DiffRhythm-*'
       - Fallback to known defaults
+    Results are cached until one of the scanned dirs/files changes mtime.
     """
     env_models = os.environ.get('DIFFRHYTHM_MODELS')
     if env_models:
         vals = [s.strip() for s in env_models.replace('\n', ',').split(',') if s.strip()]
         return sorted(set(vals))
 
+    key = tuple(_mtime_or_none(diff_root / rel) for rel in MODEL_DIRS + MODEL_GREP_FILES)
+    cached = _MODEL_CACHE.get(str(diff_root))
+    if cached and cached[0] == key:
+        return list(cached[1])
+
     found = set()
 
     # Directory-based discovery
-    for dname in ['models', 'checkpoints', 'pretrained', 'pretrained_models']:
-        d = diff_root / dname
-        if d.exists() and d.is_dir():
-            for x in d.iterdir():
-                name = x.name
-                if x.is_dir() and name.lower().startswith('diffrhythm-'):
-                    found.add(f'ASLP-lab/{name}')
-                elif x.is_file():
-                    import re as _re
-                    m = _re.match(r'(DiffRhythm[-_][0-9][._][0-9])', name, flags=_re.I)
-                    if m:
-                        token = m.group(1).replace('.', '_')
-                        found.add(f'ASLP-lab/{token}')
-
-    # Grep key files
-    for rel in ['infer/infer.py', 'README.md']:
-        f = diff_root / rel
-        if f.exists():
-            try:
-                txt = f.read_text(encoding='utf-8', errors='ignore')
-                import re as _re
-                for m in _re.finditer(r'ASLP-lab/(DiffRhythm[-_][0-9][._][0-9])', txt):
+    for dname in MODEL_DIRS:
+        try:
+            with os.scandir(diff_root / dname) as it:
+                entries = list(it)
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        for x in entries:
+            name = x.name
+            if x.is_dir() and name.lower().startswith('diffrhythm-'):
+                found.add(f'ASLP-lab/{name}')
+            elif x.is_file():
+                m = _MODEL_FILE_RE.match(name)
+                if m:
                     token = m.group(1).replace('.', '_')
                     found.add(f'ASLP-lab/{token}')
-            except Exception:
-                pass
 
-    if not found:
-        return ['ASLP-lab/DiffRhythm-1_2', 'ASLP-lab/DiffRhythm-1_1']
-    return sorted(found)
+    # Grep key files
+    for rel in MODEL_GREP_FILES:
+        try:
+            with open(diff_root / rel, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for m in _MODEL_REPO_RE.finditer(mm):
+                        token = m.group(1).decode('ascii').replace('.', '_')
+                        found.add(f'ASLP-lab/{token}')
+        except (OSError, ValueError):
+            pass
+
+    models = sorted(found) if found else ['ASLP-lab/DiffRhythm-1_2', 'ASLP-lab/DiffRhythm-1_1']
+    _MODEL_CACHE[str(diff_root)] = (key, models)
+    return list(models)
 
 
-    root = resolve_diff_root(cfg)
-    models = discover_models(root)
-    resp = [{'repo_id': repo, 'label': repo.split('/')[-1].replace('_', '.') } for repo in models]
-    return jsonify({'ok': True, 'models': resp, 'diff_root': str(root)})
 RUN_LOCK = threading.Lock()
+# Every generation request holds a server thread until its job is done, so the
+# number in flight must stay below the waitress pool, with some threads left
+# over for the UI (file lists, /play, the index) while the GPU is busy.
+SERVER_THREADS = max(1, int(os.environ.get("SERVER_THREADS", "16")))
+UI_RESERVED_THREADS = 4
+MAX_QUEUED_JOBS = max(1, SERVER_THREADS - UI_RESERVED_THREADS)
+# _JOB_SLOTS bounds running + queued jobs; the queue itself needs no limit
+_JOB_SLOTS = threading.BoundedSemaphore(MAX_QUEUED_JOBS)
+JOB_QUEUE = queue.Queue()
 
 app = Flask(__name__)
 app.config["MAX_CONTENT_LENGTH"] = 1024 * 1024 * 300  # 300 MB
+# behind nginx/apache: let the front server send the wav bytes itself
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE") == "1"
 
 # Enable CORS for /api/* to ease n8n integrations
 if CORS is not None:
@@ -149,6 +215,22 @@ if CORS is not None:
 
 
 
+# Missing wavs while the UI polls are the most common error: answer the plain
+# 404/405 cases with a body encoded once at import instead of per request.
+_NOT_FOUND_BODY = json.dumps({"ok": False, "error": "Not found"}).encode("utf-8")
+_NOT_ALLOWED_BODY = json.dumps({"ok": False, "error": "Method not allowed"}).encode("utf-8")
+
+@app.errorhandler(404)
+def _json_404(e):
+    return Response(_NOT_FOUND_BODY, status=404, mimetype="application/json")
+
+@app.errorhandler(405)
+def _json_405(e):
+    resp = Response(_NOT_ALLOWED_BODY, status=405, mimetype="application/json")
+    if getattr(e, "valid_methods", None):
+        resp.headers["Allow"] = ", ".join(e.valid_methods)
+    return resp
+
 # Global JSON error handler so the client never receives HTML when it expects JSON
 @app.errorhandler(Exception)
 def _json_errors(e):
@@ -157,99 +239,377 @@ def _json_errors(e):
     if isinstance(e, HTTPException):
         code = e.code or 500
         msg = e.description or msg
-    return jsonify({"ok": False, "error": msg}), code
+    return err(msg, code)
 
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
+# orjson when available: faster, and parses bytes without a separate decode
+json_loads = orjson.loads if orjson is not None else json.loads
+
+def json_dumps_pretty(obj) -> bytes:
+    """Indented UTF-8 JSON for the files we keep on disk (config, favorites)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2).encode("utf-8")
+
+def json_dumps_line(obj) -> bytes:
+    """One compact JSON document plus a newline, for JSON Lines files."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    return json.dumps(obj).encode("utf-8") + b"\n"
+
+def atomic_write_bytes(path: Path, data: bytes):
+    """Write data to a sibling temp file, then rename it over path,
+    so a crash mid-write never leaves a truncated file behind."""
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+def atomic_write_json(path: Path, obj):
+    atomic_write_bytes(path, json_dumps_pretty(obj))
+
+def stat_key(p: Path) -> tuple:
+    """(st_mtime_ns, st_size) of p: cheap change detection for cached files."""
+    st = os.stat(p)
+    return (st.st_mtime_ns, st.st_size)
+
+def json_response(obj, status: int = 200) -> Response:
+    """JSON reply used by every route, encoded with orjson when installed."""
+    data = orjson.dumps(obj) if orjson is not None else json.dumps(obj).encode("utf-8")
+    return Response(data, status=status, mimetype="application/json")
+
+def err(msg: str, code: int = 400) -> Response:
+    """The {"ok": false, "error": msg} reply every endpoint uses for failures."""
+    return json_response({"ok": False, "error": msg}, code)
+
 DEFAULT_PROJECT_NAME = "Default"
 
 def is_reserved_project(name: str) -> bool:
     return (name or "").strip().lower() == DEFAULT_PROJECT_NAME.lower()
 
-def ensure_default_project(cfg=None):
-    base = ensure_project_base(cfg)
-    d = (base / DEFAULT_PROJECT_NAME)
-    d.mkdir(parents=True, exist_ok=True)
-    return d
+# parsed config.json, keyed on stat_key() so a request costs one stat
+_CFG_CACHE = {"key": None, "data": None}
+_CFG_LOCK = threading.Lock()
 
 def load_config():
-    if CONFIG_PATH.exists():
-        try:
-            return json.loads(CONFIG_PATH.read_text(encoding="utf-8"))
-        except Exception:
-            pass
-    return DEFAULT_CONFIG.copy()
+    try:
+        key = stat_key(CONFIG_PATH)
+    except FileNotFoundError:
+        return DEFAULT_CONFIG.copy()
+    with _CFG_LOCK:
+        if _CFG_CACHE["key"] != key:
+            try:
+                data = json_loads(CONFIG_PATH.read_bytes())
+            except Exception:
+                data = DEFAULT_CONFIG.copy()
+            _CFG_CACHE["key"], _CFG_CACHE["data"] = key, data
+        # callers update the dict in place before save_config()
+        return dict(_CFG_CACHE["data"])
 
 def save_config(cfg: dict):
-    CONFIG_PATH.write_text(json.dumps(cfg, indent=2), encoding="utf-8")
+    with _CFG_LOCK:
+        atomic_write_json(CONFIG_PATH, cfg)
+        _CFG_CACHE["key"], _CFG_CACHE["data"] = stat_key(CONFIG_PATH), dict(cfg)
+
+def timestamp_str(ts: float = None):
+    return time.strftime("%Y%m%d-%H%M%S", time.localtime(ts))
+
+# Path resolution and the mkdirs below only need to happen once per process;
+# call invalidate_project_dirs() after removing or renaming a project folder.
+@functools.lru_cache(maxsize=256)
+def _resolved_base_readonly(base_dir: str) -> Path:
+    return Path(base_dir).resolve()
+
+_ENSURED = {}  # base_dir -> resolved base whose folders were created
+_ENSURED_LOCK = threading.Lock()
+
+def _resolved_base(base_dir: str) -> Path:
+    base = _ENSURED.get(base_dir)
+    if base is not None:
+        return base
+    with _ENSURED_LOCK:
+        if base_dir not in _ENSURED:
+            base = _resolved_base_readonly(base_dir)
+            base.mkdir(parents=True, exist_ok=True)
+            # ensure Default project exists
+            (base / DEFAULT_PROJECT_NAME).mkdir(exist_ok=True)
+            _ENSURED[base_dir] = base
+        return _ENSURED[base_dir]
+
+@functools.lru_cache(maxsize=256)
+def _resolved_project(base_dir: str, safe: str) -> Path:
+    base = Path(base_dir)
+    p = (base / safe).resolve()
+    if base not in p.parents and base != p:
+        raise ValueError("Invalid project path")
+    return p
+
+@functools.lru_cache(maxsize=256)
+def _created_project(p: Path) -> Path:
+    p.mkdir(exist_ok=True)
+    return p
+
+def invalidate_project_dirs():
+    with _ENSURED_LOCK:
+        _ENSURED.clear()
+    _created_project.cache_clear()
 
-def timestamp_str():
-    return datetime.now().strftime("%Y%m%d-%H%M%S")
+def path_inside(root: Path, rel: str):
+    """Real path of root/rel, or None when it points outside root.
+
+    One realpath plus a string-level commonpath; root is already resolved."""
+    root_s = str(root)
+    cand = os.path.realpath(os.path.join(root_s, rel))
+    try:
+        if os.path.commonpath([cand, root_s]) != root_s:
+            return None
+    except ValueError:  # different drives on Windows
+        return None
+    return cand
+
+def _sanitize_project(project: str) -> str:
+    safe = (project or DEFAULT_PROJECT_NAME).strip().replace("..", "").replace("\\", "/").strip("/")
+    return safe or DEFAULT_PROJECT_NAME
 
 def ensure_project_base(cfg=None) -> Path:
+    """Resolve the projects base dir, creating it and the Default project."""
+    cfg = cfg or load_config()
+    return _resolved_base(cfg.get("base_dir", str(DEFAULT_BASE)))
+
+def ensure_project_base_readonly(cfg=None) -> Path:
+    """Resolve the projects base dir without touching the filesystem (GET routes)."""
     cfg = cfg or load_config()
-    base = Path(cfg.get("base_dir", str(DEFAULT_BASE))).resolve()
-    base.mkdir(parents=True, exist_ok=True)
-    # ensure Default project exists
-    (base / "Default").mkdir(exist_ok=True)
-    return base
+    return _resolved_base_readonly(cfg.get("base_dir", str(DEFAULT_BASE)))
 
 def project_path(project: str, cfg=None) -> Path:
     base = ensure_project_base(cfg)
-    safe = (project or "Default").strip().replace("..", "").replace("\\", "/").strip("/")
-    if not safe:
-        safe = "Default"
-    p = (base / safe).resolve()
-    if base not in p.parents and base != p:
-        raise ValueError("Invalid project path")
-    p.mkdir(exist_ok=True)
-    return p
+    return _created_project(_resolved_project(str(base), _sanitize_project(project)))
 
 def project_path_no_create(project: str, cfg=None) -> Path:
-    base = ensure_project_base(cfg)
-    safe = (project or "Default").strip().replace("..", "").replace("\\", "/").strip("/")
-    if not safe:
-        safe = "Default"
-    p = (base / safe).resolve()
-    if base not in p.parents and base != p:
-        raise ValueError("Invalid project path")
-    return p
+    base = ensure_project_base_readonly(cfg)
+    return _resolved_project(str(base), _sanitize_project(project))
+
+def send_audio(folder: Path, filename: str, **kwargs):
+    # conditional=True answers Range requests with 206 so the player can seek.
+    # Names get reused (rename, delete then rename), so the browser must
+    # revalidate every time: an unchanged file costs a 304 on its ETag.
+    resp = send_from_directory(folder, filename, conditional=True, **kwargs)
+    resp.cache_control.no_cache = True
+    resp.cache_control.private = True
+    return resp
 
 def list_audio_files(folder: Path):
+    # one scandir pass: DirEntry caches the file type and its stat() result
     items = []
-    for p in sorted(folder.glob("*.wav")):
-        items.append({
-            "name": p.name,
-            "size": p.stat().st_size,
-            "mtime": int(p.stat().st_mtime),
-        })
+    with os.scandir(folder) as it:
+        for e in it:
+            if not e.name.endswith(".wav") or not e.is_file():
+                continue
+            st = e.stat()
+            items.append({
+                "name": e.name,
+                "size": st.st_size,
+                "mtime": int(st.st_mtime),
+            })
+    items.sort(key=lambda x: x["name"])
     return items
 
+def has_wav_files(folder: Path) -> bool:
+    with os.scandir(folder) as it:
+        return any(e.name.lower().endswith(".wav") for e in it)
+
 def history_file(p: Path) -> Path:
-    return p / "history.json"
+    return p / "history.jsonl"
+
+LEGACY_HISTORY_NAME = "history.json"  # older format: one indented JSON list
+
+# history.jsonl -> [stat_key when last in sync with disk, items, n_saved, rewrite].
+# items[:n_saved] are on disk. Entries with a pending timer in _HIST_TIMERS are
+# dirty: the flush appends items[n_saved:], or replaces the file if rewrite is set.
+_HIST_CACHE = {}
+_HIST_TIMERS = {}
+_HIST_LOCK = threading.Lock()
+HISTORY_FLUSH_DELAY = 0.5  # seconds; coalesces bursts of writes into one
+
+def _encode_history(items) -> bytes:
+    return b"".join(map(json_dumps_line, items))
+
+def _loads_lenient(raw: bytes):
+    """json_loads(), retried with the stdlib parser, which also accepts the
+    NaN/Infinity that json.dumps writes (orjson rejects them)."""
+    try:
+        return json_loads(raw)
+    except ValueError:
+        return json.loads(raw)
+
+def _load_history_file(hf: Path) -> list:
+    items = []
+    for line in hf.read_bytes().splitlines():
+        if line.strip():
+            try:
+                items.append(_loads_lenient(line))
+            except ValueError:
+                pass  # skip a damaged line instead of losing the whole history
+    return items
+
+def _migrate_legacy_history(hf: Path) -> bool:
+    """Convert a history.json next to hf into JSON Lines.
+
+    False if there is none, or if it cannot be parsed: such a file is renamed
+    to history.json.bak (never deleted) and the project starts a new history."""
+    legacy = hf.with_name(LEGACY_HISTORY_NAME)
+    try:
+        raw = legacy.read_bytes()
+    except OSError:
+        return False
+    try:
+        items = _loads_lenient(raw)
+    except ValueError:
+        items = None
+    if not isinstance(items, list):
+        # unreadable: set it aside untouched instead of replacing it with nothing
+        bak = legacy.with_name(LEGACY_HISTORY_NAME + ".bak")
+        if not bak.exists():
+            try:
+                os.replace(legacy, bak)
+            except OSError:
+                pass
+        return False
+    try:
+        atomic_write_bytes(hf, _encode_history(items))
+        legacy.unlink(missing_ok=True)
+    except OSError:
+        return False
+    return True
 
 def read_history(p: Path):
     hf = history_file(p)
-    if hf.exists():
+    with _HIST_LOCK:
+        cached = _HIST_CACHE.get(hf)
+        if cached is not None and hf in _HIST_TIMERS:
+            return list(cached[1])
         try:
-            return json.loads(hf.read_text(encoding="utf-8"))
-        except Exception:
-            return []
-    return []
+            key = stat_key(hf)
+        except FileNotFoundError:
+            if not _migrate_legacy_history(hf):
+                _HIST_CACHE.pop(hf, None)
+                return []
+            key = stat_key(hf)
+        if cached is None or cached[0] != key:
+            try:
+                items = _load_history_file(hf)
+            except OSError:
+                items = []
+            cached = _HIST_CACHE[hf] = [key, items, len(items), False]
+        return list(cached[1])
+
+def _schedule_history_flush(hf: Path):
+    if hf not in _HIST_TIMERS:
+        t = threading.Timer(HISTORY_FLUSH_DELAY, _flush_history_file, args=(hf,))
+        t.daemon = True
+        _HIST_TIMERS[hf] = t
+        t.start()
 
 def write_history(p: Path, items):
-    history_file(p).write_text(json.dumps(items, indent=2), encoding="utf-8")
+    hf = history_file(p)
+    with _HIST_LOCK:
+        _HIST_CACHE[hf] = [None, list(items), 0, True]
+        _schedule_history_flush(hf)
 
-def sys_executable():
+def append_history(p: Path, entry: dict):
+    hf = history_file(p)
+    items = read_history(p)  # loads (and migrates) the file if not cached yet
+    with _HIST_LOCK:
+        # re-check under the lock: another append may have landed meanwhile
+        cached = _HIST_CACHE.get(hf)
+        if cached is None:
+            cached = _HIST_CACHE[hf] = [None, items, len(items), True]
+        cached[1].append(entry)
+        _schedule_history_flush(hf)
+
+def _flush_history_file(hf: Path):
+    with _HIST_LOCK:
+        t = _HIST_TIMERS.pop(hf, None)
+        if t is None:
+            return  # not dirty (already flushed)
+        t.cancel()
+        cached = _HIST_CACHE.get(hf)
+        if cached is None:
+            return
+        key, items, n_saved, rewrite = cached
+        try:
+            if not rewrite:
+                # only append if the file is still the one items[:n_saved] came from
+                try:
+                    rewrite = stat_key(hf) != key
+                except FileNotFoundError:
+                    rewrite = key is not None
+            if rewrite:
+                atomic_write_bytes(hf, _encode_history(items))
+            elif n_saved < len(items):
+                with open(hf, "ab") as f:
+                    f.write(_encode_history(items[n_saved:]))
+            cached[:] = [stat_key(hf), items, len(items), False]
+        except OSError:
+            # project folder was removed underneath us
+            _HIST_CACHE.pop(hf, None)
+
+def flush_history(p: Path = None):
+    """Write pending history to disk now, for one project or all of them."""
+    with _HIST_LOCK:
+        targets = [history_file(p)] if p is not None else list(_HIST_TIMERS)
+    for hf in targets:
+        _flush_history_file(hf)
+
+atexit.register(flush_history)
+
+# Bookkeeping that does not affect a response (history appends, tmp cleanup)
+# runs here so the HTTP and dispatcher threads can move on.
+_POST_IO_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="post-io")
+_POST_IO_PENDING = {}  # project dir -> set of Futures not done yet
+_POST_IO_LOCK = threading.Lock()
+
+def submit_post_io(p: Path, fn, *args) -> Future:
+    fut = _POST_IO_POOL.submit(fn, *args)
+    with _POST_IO_LOCK:
+        _POST_IO_PENDING.setdefault(p, set()).add(fut)
+
+    def _done(f):
+        with _POST_IO_LOCK:
+            pending = _POST_IO_PENDING.get(p)
+            if pending is not None:
+                pending.discard(f)
+                if not pending:
+                    del _POST_IO_PENDING[p]
+    fut.add_done_callback(_done)
+    return fut
+
+def wait_post_io(p: Path, timeout: float = 5.0):
+    """Let queued history appends for p land before reading its history."""
+    with _POST_IO_LOCK:
+        pending = list(_POST_IO_PENDING.get(p, ()))
+    if pending:
+        wait_futures(pending, timeout=timeout)
+
+_PY_BIN_CACHE = None  # result of the venv probe below; reset by POST /api/config
+
+def sys_executable(cfg=None):
+    global _PY_BIN_CACHE
     # allow override from config
     try:
-        cfg = load_config()
+        cfg = cfg or load_config()
         pbin = (cfg.get("python_bin") or "").strip()
         if pbin:
             return pbin
     except Exception:
         pass
+    if _PY_BIN_CACHE:
+        return _PY_BIN_CACHE
 
     # prefer local venvs under DiffRhythm
     if os.name == "nt":
@@ -264,119 +624,335 @@ def sys_executable():
         ]
     for c in cand:
         if c.exists():
-            return str(c)
+            _PY_BIN_CACHE = str(c)
+            return _PY_BIN_CACHE
 
     # fallback to current interpreter
-    return sys.executable or "python3"
+    _PY_BIN_CACHE = sys.executable or "python3"
+    return _PY_BIN_CACHE
+
+# \w keeps the unicode letters/digits str.isalnum() accepted, plus "_"
+_UNSAFE_NAME_RE = re.compile(r"[^\w.-]+")
 
 def secure_name(name: str) -> str:
-    name = (name or "").strip()
-    base = Path(name).name
-    safe = "".join(ch for ch in base if ch.isalnum() or ch in "._-").strip(".")
+    base = os.path.basename((name or "").strip())
+    safe = _UNSAFE_NAME_RE.sub("", base).strip(".")
     return safe or f"file-{uuid.uuid4().hex[:6]}"
 
-def save_b64(data_b64: str, filename: str, dest: Path) -> Path:
+class _HashingWriter:
+    """File wrapper that feeds everything written through blake2b."""
+
+    def __init__(self, f):
+        self.f = f
+        self.h = hashlib.blake2b(digest_size=16)
+
+    def write(self, b):
+        self.h.update(b)
+        return self.f.write(b)
+
+COPY_BUF_SIZE = 1 << 20
+
+def copy_stream(src, w):
+    """copyfileobj() through one reused buffer instead of a fresh bytes per chunk."""
+    readinto = getattr(src, "readinto", None)
+    if readinto is None:
+        shutil.copyfileobj(src, w, COPY_BUF_SIZE)
+        return
+    buf = bytearray(COPY_BUF_SIZE)
+    view = memoryview(buf)
+    while True:
+        n = readinto(buf)
+        if not n:
+            break
+        w.write(view[:n])
+
+def save_upload(copy_into, filename: str, dest: Path) -> Path:
+    """Store an upload as <blake2b digest>-<name>, reusing an identical earlier one.
+
+    copy_into(writer) streams the bytes; they land in a temp file while being
+    hashed, which is then renamed into place or dropped if the content exists."""
     dest.mkdir(parents=True, exist_ok=True)
-    fn = secure_name(filename or f"upload-{uuid.uuid4().hex[:6]}")
-    p = dest / fn
-    with open(p, "wb") as f:
-        f.write(base64.b64decode(data_b64))
-    return p
+    tmp = dest / f".upload-{uuid.uuid4().hex}.part"
+    try:
+        with open(tmp, "wb") as f:
+            w = _HashingWriter(f)
+            copy_into(w)
+        final = dest / f"{w.h.hexdigest()}-{secure_name(filename)}"
+        if final.exists():
+            os.unlink(tmp)
+        else:
+            os.replace(tmp, final)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return final
+
+def save_file_storage(file, dest: Path) -> Path:
+    """save_upload() for a multipart FileStorage, streamed from werkzeug's spool."""
+    return save_upload(lambda w: copy_stream(file.stream, w), file.filename, dest)
+
+B64_CHUNK = 1_398_100  # multiple of 4, decodes to ~1 MiB per write
+
+def save_b64(data_b64: str, filename: str, dest: Path) -> Path:
+    raw = data_b64.encode("ascii")
+    # slices must stay aligned on 4-char groups, so drop wrapped-line whitespace first
+    if any(ws in raw for ws in (b"\n", b"\r", b" ", b"\t")):
+        raw = b"".join(raw.split())
+    view = memoryview(raw)
+    # accept data URIs ("data:audio/wav;base64,....") as sent by browsers
+    if raw.startswith(b"data:"):
+        comma = raw.find(b",", 0, 256)
+        if comma != -1:
+            view = view[comma + 1:]
+
+    def copy_into(w):
+        for i in range(0, len(view), B64_CHUNK):
+            w.write(base64.b64decode(view[i:i + B64_CHUNK]))
+    return save_upload(copy_into, filename or "upload.bin", dest)
+
+# one pooled session so repeated downloads reuse keep-alive connections
+HTTP_SESSION = None
+if requests is not None:
+    HTTP_SESSION = requests.Session()
+    _adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=2)
+    HTTP_SESSION.mount("https://", _adapter)
+    HTTP_SESSION.mount("http://", _adapter)
 
 def save_from_url(url: str, filename: str | None, dest: Path) -> Path:
-    if requests is None:
+    if HTTP_SESSION is None:
         raise RuntimeError("requests not installed; cannot download URLs. Install flask-cors requests.")
-    dest.mkdir(parents=True, exist_ok=True)
-    r = requests.get(url, timeout=30, stream=True)
-    r.raise_for_status()
     guess = os.path.basename(urlparse(url).path) or "download.bin"
-    fn = secure_name(filename or guess)
-    p = dest / fn
-    with open(p, "wb") as f:
-        for chunk in r.iter_content(8192):
-            if chunk:
-                f.write(chunk)
-    return p
-
-def build_infer_cmd(args_map: dict, tmp_outdir: Path):
-    cmd = [sys_executable(), str(INFER_SCRIPT)]
+    # fail fast on unreachable hosts, but give slow servers time between chunks
+    with HTTP_SESSION.get(url, timeout=(5, 30), stream=True) as r:
+        r.raise_for_status()
+        r.raw.decode_content = True
+        return save_upload(lambda w: copy_stream(r.raw, w), filename or guess, dest)
+
+# shlex.join is 3.8+; resolve the fallback once instead of per job
+_SHLEX_JOIN = getattr(shlex, "join", None) or (lambda a: " ".join(map(shlex.quote, a)))
+
+@dataclass(slots=True)
+class InferArgs:
+    """Validated parameters of one generation, as built by the generate routes."""
+    project: str
+    mode: str
+    repo_id: str
+    audio_length: int
+    batch_infer_num: int
+    use_chunked: bool
+    steps: int
+    cfg_strength: float
+    ref_audio_path: Path | None = None  # takes precedence over ref_prompt
+    ref_prompt: str | None = None
+    lrc_path: Path | None = None
+
+def build_infer_cmd(args: InferArgs, tmp_outdir: Path, cfg=None):
+    cmd = [sys_executable(cfg), str(INFER_SCRIPT)]
     cmd += ["--output-dir", str(tmp_outdir)]
-    cmd += ["--audio-length", str(int(args_map.get("audio_length", 95)))]
-    cmd += ["--repo-id", args_map.get("repo_id", DEFAULT_CONFIG["repo_id"])]
+    cmd += ["--audio-length", str(int(args.audio_length))]
+    cmd += ["--repo-id", args.repo_id]
 
-    ref_prompt = args_map.get("ref_prompt")
-    ref_audio_path = args_map.get("ref_audio_path")
-    if ref_audio_path:
-        cmd += ["--ref-audio-path", str(ref_audio_path)]
-    elif ref_prompt:
-        cmd += ["--ref-prompt", ref_prompt]
+    if args.ref_audio_path:
+        cmd += ["--ref-audio-path", str(args.ref_audio_path)]
+    elif args.ref_prompt:
+        cmd += ["--ref-prompt", args.ref_prompt]
 
-    if args_map.get("lrc_path"):
-        cmd += ["--lrc-path", str(args_map["lrc_path"])]
+    if args.lrc_path:
+        cmd += ["--lrc-path", str(args.lrc_path)]
 
-    if bool(args_map.get("use_chunked")):
+    if args.use_chunked:
         cmd += ["--chunked"]
 
-    cmd += ["--batch-infer-num", str(int(args_map.get("batch_infer_num", 1)))]
+    cmd += ["--batch-infer-num", str(int(args.batch_infer_num))]
 
     # quality flags
-    if "steps" in args_map:
-        cmd += ["--steps", str(int(args_map["steps"]))]
-    if "cfg_strength" in args_map:
-        cmd += ["--cfg-strength", str(float(args_map["cfg_strength"]))]
+    cmd += ["--steps", str(int(args.steps))]
+    cmd += ["--cfg-strength", str(float(args.cfg_strength))]
 
     return cmd
 
-def run_infer(args_map: dict, env_extra: dict):
+class InferWorker:
+    """A long-lived infer_worker.py child that keeps DiffRhythm loaded.
+
+    Jobs are sent to the child's stdin as JSON lines and a reader thread
+    resolves the matching Future when the answer comes back. The child is
+    started lazily and restarted when the python binary or
+    CUDA_VISIBLE_DEVICES differ from the ones it was started with.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._proc = None
+        self._key = None
+        self._pending = {}
+
+    def submit(self, argv: list, python_bin: str, env: dict) -> Future:
+        fut = Future()
+        job_id = uuid.uuid4().hex
+        key = (python_bin, env.get("CUDA_VISIBLE_DEVICES", ""))
+        with self._lock:
+            try:
+                proc = self._ensure_started(key, python_bin, env)
+                self._pending[job_id] = fut
+                proc.stdin.write(json.dumps({"job_id": job_id, "argv": argv}) + "\n")
+                proc.stdin.flush()
+            except OSError as e:
+                self._pending.pop(job_id, None)
+                fut.set_exception(RuntimeError(f"Inference worker unavailable: {e}"))
+        return fut
+
+    def stop(self):
+        with self._lock:
+            self._stop_locked()
+
+    def _ensure_started(self, key, python_bin: str, env: dict):
+        if self._proc is not None and self._proc.poll() is None and self._key == key:
+            return self._proc
+        self._stop_locked()
+        proc = subprocess.Popen(
+            [python_bin, "-u", str(WORKER_SCRIPT), str(DIFF_ROOT), str(INFER_SCRIPT)],
+            cwd=str(DIFF_ROOT),
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+        self._proc, self._key = proc, key
+        threading.Thread(target=self._read_replies, args=(proc,),
+                         name="infer-worker-reader", daemon=True).start()
+        return proc
+
+    def _stop_locked(self):
+        proc, self._proc, self._key = self._proc, None, None
+        pending, self._pending = self._pending, {}
+        for fut in pending.values():
+            fut.set_exception(RuntimeError("Inference worker restarted"))
+        if proc is None or proc.poll() is not None:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=10)
+        except Exception:
+            proc.kill()
+
+    def _read_replies(self, proc):
+        for line in proc.stdout:
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                continue
+            with self._lock:
+                fut = self._pending.pop(msg.get("job_id"), None)
+            if fut is not None:
+                fut.set_result(msg)
+        proc.wait()
+        # the child exited: fail whatever it still owed us
+        with self._lock:
+            if self._proc is not proc:
+                return
+            self._proc, self._key = None, None
+            pending, self._pending = self._pending, {}
+        for fut in pending.values():
+            fut.set_exception(RuntimeError(f"Inference worker exited with code {proc.returncode}"))
+
+
+INFER_WORKER = InferWorker()
+atexit.register(INFER_WORKER.stop)
+
+_BASE_ENV = {**os.environ, "PYTHONPATH": f"{DIFF_ROOT}{os.pathsep}" + os.environ.get("PYTHONPATH", "")}
+if sys.platform == "darwin" and "PHONEMIZER_ESPEAK_LIBRARY" not in _BASE_ENV:
+    _BASE_ENV["PHONEMIZER_ESPEAK_LIBRARY"] = \
+        "/opt/homebrew/Cellar/espeak-ng/1.52.0/lib/libespeak-ng.dylib"
+
+@functools.lru_cache(maxsize=8)
+def job_env(cuda_val: str) -> dict:
+    """Environment for infer.py, built once per CUDA_VISIBLE_DEVICES value.
+
+    Shared between jobs: subprocess only reads it, so nobody may mutate it."""
+    if not cuda_val:
+        return _BASE_ENV
+    return {**_BASE_ENV, "CUDA_VISIBLE_DEVICES": cuda_val}
+
+def prepare_job(args: InferArgs, env_extra: dict, cfg: dict) -> dict:
     run_token = f"run-{uuid.uuid4().hex[:8]}"
     tmp_outdir = (TMP_DIR / run_token)
     tmp_outdir.mkdir(parents=True, exist_ok=True)
 
-    cmd = build_infer_cmd(args_map, tmp_outdir)
+    cmd = build_infer_cmd(args, tmp_outdir, cfg)
 
-    env = os.environ.copy()
-    env["PYTHONPATH"] = f"{DIFF_ROOT}{os.pathsep}" + env.get("PYTHONPATH", "")
     cuda_val = env_extra.get("CUDA_VISIBLE_DEVICES")
-    if cuda_val is not None and cuda_val != "":
-        env["CUDA_VISIBLE_DEVICES"] = str(cuda_val)
-    if sys.platform == "darwin" and "PHONEMIZER_ESPEAK_LIBRARY" not in env:
-        env["PHONEMIZER_ESPEAK_LIBRARY"] = \
-            "/opt/homebrew/Cellar/espeak-ng/1.52.0/lib/libespeak-ng.dylib"
-
-    # Pre-log: command and params
-    sh_join = getattr(shlex, "join", None)
-    joined_cmd = sh_join(cmd) if sh_join else " ".join(map(shlex.quote, cmd))
+    env = job_env(str(cuda_val) if cuda_val is not None else "")
+
+    return {
+        "args": args,
+        "cfg": cfg,
+        "tmp_outdir": tmp_outdir,
+        "cmd": cmd,
+        "env": env,
+    }
+
+def move_file(src: Path, dst: Path):
+    """Move src to dst with a single rename; copy only across filesystems."""
+    try:
+        os.replace(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+        os.unlink(src)
+
+def remove_tmp_dir(tmp_outdir: Path):
+    try:
+        os.rmdir(tmp_outdir)
+    except OSError:
+        # infer.py left other files behind
+        shutil.rmtree(tmp_outdir, ignore_errors=True)
+
+def build_prelog(job: dict) -> str:
+    """Command and params header prepended to the logs of a job."""
+    args = job["args"]
     prelog = []
-    prelog.append("DR-GUI CMD: " + joined_cmd + "\n")
-    prelog.append("DR-GUI ENV: CUDA_VISIBLE_DEVICES=" + env.get("CUDA_VISIBLE_DEVICES", "") + "\n")
+    prelog.append("DR-GUI CMD: " + _SHLEX_JOIN(job["cmd"]) + "\n")
+    prelog.append("DR-GUI ENV: CUDA_VISIBLE_DEVICES=" + job["env"].get("CUDA_VISIBLE_DEVICES", "") + "\n")
     prelog.append(
         "DR-GUI PARAMS: "
-        f"project={args_map.get('project')} "
-        f"mode={args_map.get('mode', 'unknown')} "
-        f"repo_id={args_map.get('repo_id')} "
-        f"audio_length={args_map.get('audio_length')} "
-        f"batch_infer_num={args_map.get('batch_infer_num')} "
-        f"steps={args_map.get('steps')} "
-        f"cfg_strength={args_map.get('cfg_strength')} "
-        f"chunked={bool(args_map.get('use_chunked'))} "
-        f"ref={'audio' if 'ref_audio_path' in args_map else 'prompt'}\n"
-    )
-    prelog_txt = "".join(prelog) + "\n"
-
-    proc = subprocess.run(
-        cmd,
-        cwd=str(DIFF_ROOT),
-        env=env,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
+        f"project={args.project} "
+        f"mode={args.mode} "
+        f"repo_id={args.repo_id} "
+        f"audio_length={args.audio_length} "
+        f"batch_infer_num={args.batch_infer_num} "
+        f"steps={args.steps} "
+        f"cfg_strength={args.cfg_strength} "
+        f"chunked={bool(args.use_chunked)} "
+        f"ref={'audio' if args.ref_audio_path else 'prompt'}\n"
     )
-
-    logs = prelog_txt + (proc.stdout or "")
+    return "".join(prelog) + "\n"
+
+# history entry ids: unique and increasing even for entries stamped the same second
+_HIST_COUNTER = itertools.count(int(time.time() * 1000))
+
+def output_name(project_dir: Path, ts: int) -> str:
+    """output-<stamp>.wav, suffixed -2, -3... if that second already has a file.
+    Only the dispatcher thread calls this, so check-then-move cannot race."""
+    stem = f"output-{timestamp_str(ts)}"
+    name, n = f"{stem}.wav", 1
+    while (project_dir / name).exists():
+        n += 1
+        name = f"{stem}-{n}.wav"
+    return name
+
+def finish_job(job: dict, returncode: int, out: str) -> dict:
+    args, tmp_outdir = job["args"], job["tmp_outdir"]
+    # the header is only worth building when someone is going to read it
+    if returncode != 0 or job["cfg"].get("verbose_logs", False):
+        logs = build_prelog(job) + out
+    else:
+        logs = out
 
     # Move result to project folder
-    project_dir = project_path(args_map.get("project"))
-    final_name = f"output-{timestamp_str()}.wav"
+    project_dir = project_path(args.project, job["cfg"])
+    # one clock read per job: names the file and stamps its history entry
+    ts = int(time.time())
+    final_name = output_name(project_dir, ts)
     src = tmp_outdir / "output.wav"
     if not src.exists():
         wavs = list(tmp_outdir.glob("*.wav"))
@@ -386,22 +962,149 @@ def run_infer(args_map: dict, env_extra: dict):
 
     ok = False
     if src.exists():
-        shutil.move(str(src), str(final_path))
+        try:
+            move_file(src, final_path)
+        except FileNotFoundError:
+            # folder removed outside the API after _created_project cached it
+            invalidate_project_dirs()
+            project_dir.mkdir(parents=True, exist_ok=True)
+            move_file(src, final_path)
         ok = True
 
-    try:
-        shutil.rmtree(tmp_outdir, ignore_errors=True)
-    except Exception:
-        pass
+    submit_post_io(TMP_DIR, remove_tmp_dir, tmp_outdir)
 
     return {
-        "ok": ok and proc.returncode == 0,
-        "returncode": proc.returncode,
+        "ok": ok and returncode == 0,
+        "returncode": returncode,
         "logs": logs,
         "outfile": str(final_path if ok else ""),
         "outfile_name": final_name if ok else "",
+        "ts": ts,
     }
 
+def batch_key(job: dict) -> tuple:
+    a = job["args"]
+    return (a.repo_id, a.steps, a.cfg_strength, a.audio_length,
+            bool(a.use_chunked), job["env"].get("CUDA_VISIBLE_DEVICES", ""))
+
+def fail_job(job: dict, fut: Future, exc: BaseException):
+    """Answer one job with exc (unless already answered) and drop its run dir."""
+    if not fut.done():
+        fut.set_exception(exc)
+        submit_post_io(TMP_DIR, remove_tmp_dir, job["tmp_outdir"])
+
+def complete_job(job: dict, fut: Future, returncode: int, out: str):
+    # a failure here (e.g. moving the wav) belongs to this job alone, not its group
+    try:
+        fut.set_result(finish_job(job, returncode, out))
+    except Exception as e:
+        fail_job(job, fut, e)
+
+def run_group(group: list, cfg: dict):
+    """Run jobs sharing the same model/settings back-to-back.
+
+    infer.py takes a single prompt per call (--batch-infer-num samples one
+    prompt several times), so the group is pipelined into the warm worker
+    in one go instead of being fused into a single invocation.
+    """
+    if cfg.get("persistent_worker", True):
+        # cmd is [python, infer.py, *argv]; the worker already runs infer.py
+        pending = [(job, fut, INFER_WORKER.submit(job["cmd"][2:], job["cmd"][0], job["env"]))
+                   for job, fut in group]
+        for job, fut, reply_fut in pending:
+            try:
+                reply = reply_fut.result()
+                returncode, out = reply.get("returncode", 1), reply.get("logs") or ""
+            except RuntimeError as e:
+                returncode, out = -1, f"DR-GUI WORKER: {e}\n"
+            complete_job(job, fut, returncode, out)
+        return
+
+    for job, fut in group:
+        proc = subprocess.run(
+            job["cmd"],
+            cwd=str(DIFF_ROOT),
+            env=job["env"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+        )
+        complete_job(job, fut, proc.returncode, proc.stdout or "")
+
+def cfg_number(cfg: dict, key: str, cast, lo, hi):
+    """cfg[key] converted with cast and clamped to [lo, hi]; the default if unusable."""
+    try:
+        value = cast(cfg.get(key, DEFAULT_CONFIG[key]))
+    except (TypeError, ValueError):
+        value = DEFAULT_CONFIG[key]
+    if value != value:  # NaN
+        value = DEFAULT_CONFIG[key]
+    return min(max(value, lo), hi)
+
+def _fill_batch(batch: list) -> dict:
+    """Block for one job, then gather more for up to batch_wait_timeout_ms.
+    Jobs land in batch as they are taken, so the caller can fail them all."""
+    batch.append(JOB_QUEUE.get())
+    cfg = load_config()
+    max_batch = cfg_number(cfg, "max_batch_size", int, 1, MAX_QUEUED_JOBS)
+    wait_ms = cfg_number(cfg, "batch_wait_timeout_ms", float, 0.0, 5000.0)
+    deadline = time.monotonic() + wait_ms / 1000.0
+    while len(batch) < max_batch:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(JOB_QUEUE.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return cfg
+
+def batch_dispatcher():
+    """Single consumer of JOB_QUEUE: drain a batch, group it, run each group."""
+    while True:
+        batch = []
+        try:
+            cfg = _fill_batch(batch)
+            groups = {}
+            for job, fut in batch:
+                groups.setdefault(batch_key(job), []).append((job, fut))
+            for group in groups.values():
+                try:
+                    with RUN_LOCK:
+                        run_group(group, cfg)
+                except Exception as e:
+                    for job, fut in group:
+                        fail_job(job, fut, e)
+        except Exception as e:
+            # never leave a caller of run_infer() waiting on a future nobody owns
+            for job, fut in batch:
+                fail_job(job, fut, e)
+
+_DISPATCHER_LOCK = threading.Lock()
+_DISPATCHER = None
+
+def ensure_dispatcher():
+    global _DISPATCHER
+    with _DISPATCHER_LOCK:
+        if _DISPATCHER is None or not _DISPATCHER.is_alive():
+            _DISPATCHER = threading.Thread(target=batch_dispatcher, name="batch-dispatcher", daemon=True)
+            _DISPATCHER.start()
+
+def run_infer(args: InferArgs, env_extra: dict, cfg=None):
+    """Queue a generation for the batch dispatcher and wait for its result.
+
+    Raises queue.Full when MAX_QUEUED_JOBS are already running or waiting."""
+    if not _JOB_SLOTS.acquire(blocking=False):
+        raise queue.Full
+    try:
+        job = prepare_job(args, env_extra, cfg or load_config())
+        fut = Future()
+        ensure_dispatcher()
+        JOB_QUEUE.put((job, fut))
+        return fut.result()
+    finally:
+        _JOB_SLOTS.release()
+
 # ---------------------------------------------------------------------------
 # Routes: UI pages
 # ---------------------------------------------------------------------------
@@ -419,8 +1122,9 @@ def favicon():
 # ---------------------------------------------------------------------------
 @app.route("/api/config", methods=["GET", "POST"]) 
 def api_config():
+    global _PY_BIN_CACHE
     if request.method == "GET":
-        return jsonify(load_config())
+        return json_response(load_config())
     data = request.get_json(force=True)
     cfg = load_config()
     cfg.update({
@@ -435,52 +1139,62 @@ def api_config():
         "active_project": data.get("active_project", cfg["active_project"]),
         "python_bin": data.get("python_bin", cfg.get("python_bin", "")),
     })
+    # base_dir may have changed or been removed: bootstrap it again, and
+    # re-probe the python binary / DiffRhythm root on the next job
+    invalidate_project_dirs()
+    _PY_BIN_CACHE = None
+    _resolve_diff_root.cache_clear()
     ensure_project_base(cfg)
     save_config(cfg)
-    return jsonify({"ok": True, "config": cfg})
+    return json_response({"ok": True, "config": cfg})
 
 @app.route("/api/projects/list", methods=["GET"]) 
 def api_projects_list():
     cfg = load_config()
-    base = ensure_project_base(cfg)
+    base = ensure_project_base_readonly(cfg)
     projects = []
-    for p in sorted([d for d in base.iterdir() if d.is_dir()]):
-        files = list_audio_files(p)
+    try:
+        with os.scandir(base) as it:
+            dirs = sorted((e for e in it if e.is_dir()), key=lambda e: e.name)
+    except FileNotFoundError:
+        dirs = []
+    for d in dirs:
+        files = list_audio_files(d.path)
         projects.append({
-            "name": p.name,
+            "name": d.name,
             "count": len(files),
         })
-    return jsonify({"projects": projects, "active": cfg.get("active_project", "Default")})
+    return json_response({"projects": projects, "active": cfg.get("active_project", "Default")})
 
 @app.route("/api/projects/create", methods=["POST"])
 def api_projects_create():
     cfg = load_config()
-    ensure_default_project(cfg)
+    ensure_project_base(cfg)
 
     data = request.get_json(force=True)
     name = (data.get("name") or "").strip()
     if is_reserved_project(name):
-        return jsonify({"ok": False, "error": "The name 'Default' is reserved."}), 400
+        return err("The name 'Default' is reserved.", 400)
     
     p = project_path_no_create(name, cfg)
     if p.exists():
-        return jsonify({"ok": False, "error": "Project already exists"}), 400
+        return err("Project already exists", 400)
     p.mkdir(parents=True, exist_ok=True)
-    return jsonify({"ok": True, "name": p.name})
+    return json_response({"ok": True, "name": p.name})
 
 @app.route("/api/projects/rename", methods=["POST"])
 def api_projects_rename():
     cfg = load_config()
-    ensure_default_project(cfg)
+    ensure_project_base(cfg)
 
     data = request.get_json(force=True)
     old = (data.get("old") or "").strip()
     new = (data.get("new") or "").strip()
 
     if is_reserved_project(old):
-        return jsonify({"ok": False, "error": "The 'Default' project cannot be renamed."}), 400
+        return err("The 'Default' project cannot be renamed.", 400)
     if is_reserved_project(new):
-        return jsonify({"ok": False, "error": "You cannot rename a project to the reserved name 'Default'."}), 400
+        return err("You cannot rename a project to the reserved name 'Default'.", 400)
 
     # chemins sans création implicite
     src = project_path_no_create(old, cfg)
@@ -488,14 +1202,17 @@ def api_projects_rename():
 
     # validations
     if not src.exists():
-        return jsonify({"ok": False, "error": "Source project does not exist"}), 400
+        return err("Source project does not exist", 400)
     if dst.exists():
-        return jsonify({"ok": False, "error": "Target project already exists"}), 400
+        return err("Target project already exists", 400)
     if src == dst:
-        return jsonify({"ok": True})  # rien à faire
+        return json_response({"ok": True})  # rien à faire
 
     try:
+        wait_post_io(src)
+        flush_history(src)
         src.rename(dst)  # move atomique
+        invalidate_project_dirs()
         # maj projet actif
         if cfg.get("active_project") == old:
             cfg["active_project"] = new
@@ -503,45 +1220,45 @@ def api_projects_rename():
 
         # sécurité anti-réapparition si un GET concurrent l'a recréé vide
         try:
-            if src.exists():
-                items = list(src.iterdir())
-                if not any(x.suffix.lower() == ".wav" for x in items):
-                    shutil.rmtree(src)
+            if src.exists() and not has_wav_files(src):
+                shutil.rmtree(src)
         except Exception:
             pass
 
-        return jsonify({"ok": True})
+        return json_response({"ok": True})
     except Exception as e:
-        return jsonify({"ok": False, "error": str(e)}), 400
+        return err(str(e), 400)
 
 @app.route("/api/projects/delete", methods=["POST"]) 
 def api_projects_delete():
     cfg = load_config()
-    ensure_default_project(cfg)
+    ensure_project_base(cfg)
 
     data = request.get_json(force=True)
     name = (data.get("name") or "").strip()
 
     if is_reserved_project(name):
-        return jsonify({"ok": False, "error": "The 'Default' project cannot be deleted."}), 400
+        return err("The 'Default' project cannot be deleted.", 400)
     
     force = bool(data.get("force"))
     p = project_path(name, cfg)
     try:
+        wait_post_io(p)
+        flush_history(p)
         if force:
             shutil.rmtree(p)
         else:
-            # only if empty or only history.json
-            items = [x for x in p.iterdir()]
-            if any(x.suffix.lower() == ".wav" for x in items):
-                return jsonify({"ok": False, "error": "Project not empty"}), 400
+            # only if empty or only history.jsonl
+            if has_wav_files(p):
+                return err("Project not empty", 400)
             shutil.rmtree(p)
+        invalidate_project_dirs()
         if cfg.get("active_project") == name:
             cfg["active_project"] = "Default"
             save_config(cfg)
-        return jsonify({"ok": True})
+        return json_response({"ok": True})
     except Exception as e:
-        return jsonify({"ok": False, "error": str(e)}), 400
+        return err(str(e), 400)
 
 # ---------------------------------------------------------------------------
 # Routes: Files
@@ -549,15 +1266,15 @@ def api_projects_delete():
 @app.route("/api/files/list", methods=["GET"])
 def api_files_list():
     cfg = load_config()
-    ensure_default_project(cfg)
 
     proj = request.args.get("project", cfg.get("active_project", DEFAULT_PROJECT_NAME)) or DEFAULT_PROJECT_NAME
     p = project_path_no_create(proj, cfg)  # helper "no-create" si tu l'as ajouté
+    wait_post_io(p)
 
     if not p.exists():
-        return jsonify({"project": proj, "files": [], "history": []})
+        return json_response({"project": proj, "files": [], "history": []})
 
-    return jsonify({"project": p.name, "files": list_audio_files(p), "history": read_history(p)})
+    return json_response({"project": p.name, "files": list_audio_files(p), "history": read_history(p)})
 
 @app.route("/api/files/delete", methods=["POST"]) 
 def api_files_delete():
@@ -565,18 +1282,20 @@ def api_files_delete():
     data = request.get_json(force=True)
     proj = data.get("project", cfg.get("active_project", "Default"))
     p = project_path(proj, cfg)
-    target = (p / data.get("name", "")).resolve()
-    if p not in target.parents and p != target:
-        return jsonify({"ok": False, "error": "Invalid path"}), 400
+    wait_post_io(p)
+    target = path_inside(p, data.get("name", ""))
+    if target is None:
+        return err("Invalid path", 400)
+    target = Path(target)
     try:
         target.unlink(missing_ok=False)
         # remove from history entries matching this file
         h = read_history(p)
         h = [e for e in h if e.get("file") != target.name]
         write_history(p, h)
-        return jsonify({"ok": True})
+        return json_response({"ok": True})
     except Exception as e:
-        return jsonify({"ok": False, "error": str(e)}), 400
+        return err(str(e), 400)
 
 @app.route("/api/files/rename", methods=["POST"]) 
 def api_files_rename():
@@ -584,10 +1303,12 @@ def api_files_rename():
     data = request.get_json(force=True)
     proj = data.get("project", cfg.get("active_project", "Default"))
     p = project_path(proj, cfg)
-    src = (p / data.get("src", "")).resolve()
-    dst = (p / data.get("dst", "")).resolve()
-    if p not in src.parents or p not in dst.parents:
-        return jsonify({"ok": False, "error": "Invalid path"}), 400
+    wait_post_io(p)
+    src = path_inside(p, data.get("src", ""))
+    dst = path_inside(p, data.get("dst", ""))
+    if src in (None, str(p)) or dst in (None, str(p)):
+        return err("Invalid path", 400)
+    src, dst = Path(src), Path(dst)
     try:
         src.rename(dst)
         # update history
@@ -596,36 +1317,33 @@ def api_files_rename():
             if e.get("file") == src.name:
                 e["file"] = dst.name
         write_history(p, h)
-        return jsonify({"ok": True})
+        return json_response({"ok": True})
     except Exception as e:
-        return jsonify({"ok": False, "error": str(e)}), 400
+        return err(str(e), 400)
 
 @app.route("/play/<project>/<path:filename>") 
 def play_file(project, filename):
     cfg = load_config()
-    p = project_path(project, cfg)
+    p = project_path_no_create(project, cfg)
     file_path = (p / filename).resolve()
-    if not file_path.exists():
+    if not file_path.is_file():
         abort(404)
-    return send_from_directory(p, filename, mimetype="audio/wav", as_attachment=False)
+    return send_audio(p, filename, mimetype="audio/wav", as_attachment=False)
 
 @app.route("/download/<project>/<path:filename>") 
 def download_file(project, filename):
     cfg = load_config()
-    p = project_path(project, cfg)
+    p = project_path_no_create(project, cfg)
     file_path = (p / filename).resolve()
-    if not file_path.exists():
+    if not file_path.is_file():
         abort(404)
-    return send_from_directory(p, filename, as_attachment=True)
+    return send_audio(p, filename, mimetype="audio/wav", as_attachment=True)
 
 # ---------------------------------------------------------------------------
 # Routes: Generation
 # ---------------------------------------------------------------------------
 @app.route("/api/generate", methods=["POST"]) 
 def api_generate():
-    if not RUN_LOCK.acquire(blocking=False):
-        return jsonify({"ok": False, "error": "Another job is running"}), 429
-
     try:
         cfg = load_config()
         project = request.form.get("project", cfg.get("active_project", "Default"))
@@ -645,37 +1363,31 @@ def api_generate():
         if ref_mode == "prompt":
             ref_prompt = request.form.get("ref_prompt", "").strip()
             if not ref_prompt:
-                return jsonify({"ok": False, "error": "Text prompt is required when prompt mode is selected"}), 400
+                return err("Text prompt is required when prompt mode is selected", 400)
         else:  # audio mode
             # Check for existing project file first
             ref_audio_existing = request.form.get("ref_audio_existing", "").strip()
             if ref_audio_existing:
-                cand = (project_dir / ref_audio_existing).resolve()
-                if (project_dir in cand.parents or project_dir == cand) and cand.exists():
-                    ref_audio_path = cand
+                cand = path_inside(project_dir, ref_audio_existing)
+                if cand is None:
+                    raise ValueError("Invalid ref path")
+                if os.path.isfile(cand):
+                    ref_audio_path = Path(cand)
             
             # Check for uploaded file if no existing file
             if not ref_audio_path:
                 file = request.files.get("ref_audio")
                 if file and file.filename:
-                    fname = f"ref-{uuid.uuid4().hex[:8]}-{Path(file.filename).name}"
-                    ref_p = UPLOADS_DIR / fname
-                    UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
-                    file.save(str(ref_p))
-                    ref_audio_path = ref_p
+                    ref_audio_path = save_file_storage(file, UPLOADS_DIR)
             
             if not ref_audio_path:
-                return jsonify({"ok": False, "error": "Audio reference is required when audio mode is selected"}), 400
+                return err("Audio reference is required when audio mode is selected", 400)
 
         # Handle LRC file (optional, advanced mode only)
         if mode == "advanced":
             lrc_file = request.files.get("lrc_file")
             if lrc_file and lrc_file.filename:
-                lrc_name = f"lrc-{uuid.uuid4().hex[:8]}-{Path(lrc_file.filename).name}"
-                lrc_p = UPLOADS_DIR / lrc_name
-                UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
-                lrc_file.save(str(lrc_p))
-                lrc_path = lrc_p
+                lrc_path = save_file_storage(lrc_file, UPLOADS_DIR)
 
         # Get parameters based on mode
         if mode == "simple":
@@ -701,33 +1413,27 @@ def api_generate():
             use_chunked = request.form.get("use_chunked") == "on"
             cuda_visible_devices = request.form.get("cuda_visible_devices", cfg["cuda_visible_devices"]) or "0"
 
-        # Build args map for inference
-        args_map = {
-            "project": project,
-            "mode": mode,
-            "repo_id": repo_id,
-            "audio_length": audio_length,
-            "batch_infer_num": batch_infer_num,
-            "use_chunked": use_chunked,
-            "steps": steps,
-            "cfg_strength": cfg_strength,
-        }
-        
-        if ref_audio_path:
-            args_map["ref_audio_path"] = ref_audio_path
-        else:
-            args_map["ref_prompt"] = ref_prompt
-            
-        if lrc_path:
-            args_map["lrc_path"] = lrc_path
-
-        result = run_infer(args_map, {"CUDA_VISIBLE_DEVICES": cuda_visible_devices})
+        # Build args for inference
+        args = InferArgs(
+            project=project,
+            mode=mode,
+            repo_id=repo_id,
+            audio_length=audio_length,
+            batch_infer_num=batch_infer_num,
+            use_chunked=use_chunked,
+            steps=steps,
+            cfg_strength=cfg_strength,
+            ref_audio_path=ref_audio_path or None,
+            ref_prompt=None if ref_audio_path else ref_prompt,
+            lrc_path=lrc_path or None,
+        )
+        result = run_infer(args, {"CUDA_VISIBLE_DEVICES": cuda_visible_devices}, cfg)
 
         # write history entry on success
         if result.get("ok"):
-            h = read_history(project_dir)
             history_entry = {
-                "ts": int(time.time()),
+                "id": next(_HIST_COUNTER),
+                "ts": result["ts"],
                 "file": result.get("outfile_name"),
                 "mode": mode,
                 "ref_mode": ref_mode,
@@ -740,26 +1446,22 @@ def api_generate():
                 "chunked": use_chunked,
                 "batch_infer_num": batch_infer_num,
             }
-            h.append(history_entry)
-            write_history(project_dir, h)
+            submit_post_io(project_dir, append_history, project_dir, history_entry)
 
-        return jsonify(result)
+        return json_response(result)
 
+    except queue.Full:
+        return err("Too many queued jobs, try again later", 503)
     except ValueError as e:
-        return jsonify({"ok": False, "error": str(e)}), 400
+        return err(str(e), 400)
     except Exception as e:
-        return jsonify({"ok": False, "error": f"Generation failed: {str(e)}"}), 500
-    finally:
-        RUN_LOCK.release()
+        return err(f"Generation failed: {str(e)}", 500)
 
 # ---------------------------------------------------------------------------
 # Routes: Generation (JSON for n8n and programmatic clients)
 # ---------------------------------------------------------------------------
 @app.route("/api/generate/json", methods=["POST"]) 
 def api_generate_json():
-    if not RUN_LOCK.acquire(blocking=False):
-        return jsonify({"ok": False, "error": "Another job is running"}), 429
-
     try:
         cfg = load_config()
         data = request.get_json(force=True)
@@ -784,10 +1486,11 @@ def api_generate_json():
         if ref_mode == "audio":
             # existing project file as ref
             if data.get("ref_audio_existing"):
-                cand = (project_dir / secure_name(data.get("ref_audio_existing"))).resolve()
-                if project_dir in cand.parents or project_dir == cand:
-                    if cand.exists():
-                        ref_audio_path = cand
+                cand = path_inside(project_dir, secure_name(data.get("ref_audio_existing")))
+                if cand is None:
+                    raise ValueError("Invalid ref path")
+                if os.path.isfile(cand):
+                    ref_audio_path = Path(cand)
 
             # b64 audio
             if not ref_audio_path and data.get("ref_audio_b64"):
@@ -796,14 +1499,14 @@ def api_generate_json():
             # url audio
             if not ref_audio_path and data.get("ref_audio_url"):
                 if requests is None:
-                    return jsonify({"ok": False, "error": "requests not installed; cannot fetch URLs"}), 400
+                    return err("requests not installed; cannot fetch URLs", 400)
                 ref_audio_path = save_from_url(data["ref_audio_url"], data.get("ref_audio_filename"), UPLOADS_DIR)
                 
             if not ref_audio_path:
-                return jsonify({"ok": False, "error": "Audio reference is required when audio mode is selected"}), 400
+                return err("Audio reference is required when audio mode is selected", 400)
         else:
             if not ref_prompt.strip():
-                return jsonify({"ok": False, "error": "Text prompt is required when prompt mode is selected"}), 400
+                return err("Text prompt is required when prompt mode is selected", 400)
 
         # LRC (optional) via b64 or URL
         lrc_path = None
@@ -811,32 +1514,28 @@ def api_generate_json():
             lrc_path = save_b64(data["lrc_b64"], data.get("lrc_filename") or "lyrics.lrc", UPLOADS_DIR)
         elif data.get("lrc_url"):
             if requests is None:
-                return jsonify({"ok": False, "error": "requests not installed; cannot fetch URLs"}), 400
+                return err("requests not installed; cannot fetch URLs", 400)
             lrc_path = save_from_url(data["lrc_url"], data.get("lrc_filename"), UPLOADS_DIR)
 
-        args_map = {
-            "project": project,
-            "mode": mode,
-            "repo_id": repo_id,
-            "audio_length": audio_length,
-            "batch_infer_num": batch_infer_num,
-            "use_chunked": use_chunked,
-            "steps": steps,
-            "cfg_strength": cfg_strength,
-        }
-        if ref_audio_path:
-            args_map["ref_audio_path"] = ref_audio_path
-        else:
-            args_map["ref_prompt"] = ref_prompt
-        if lrc_path:
-            args_map["lrc_path"] = lrc_path
-
-        result = run_infer(args_map, {"CUDA_VISIBLE_DEVICES": cuda_visible_devices})
+        args = InferArgs(
+            project=project,
+            mode=mode,
+            repo_id=repo_id,
+            audio_length=audio_length,
+            batch_infer_num=batch_infer_num,
+            use_chunked=use_chunked,
+            steps=steps,
+            cfg_strength=cfg_strength,
+            ref_audio_path=ref_audio_path or None,
+            ref_prompt=None if ref_audio_path else ref_prompt,
+            lrc_path=lrc_path or None,
+        )
+        result = run_infer(args, {"CUDA_VISIBLE_DEVICES": cuda_visible_devices}, cfg)
 
         if result.get("ok"):
-            h = read_history(project_dir)
             history_entry = {
-                "ts": int(time.time()),
+                "id": next(_HIST_COUNTER),
+                "ts": result["ts"],
                 "file": result.get("outfile_name"),
                 "mode": mode,
                 "ref_mode": ref_mode,
@@ -849,29 +1548,83 @@ def api_generate_json():
                 "chunked": use_chunked,
                 "batch_infer_num": batch_infer_num,
             }
-            h.append(history_entry)
-            write_history(project_dir, h)
+            submit_post_io(project_dir, append_history, project_dir, history_entry)
 
-        return jsonify(result)
+        return json_response(result)
 
+    except queue.Full:
+        return err("Too many queued jobs, try again later", 503)
     except ValueError as e:
-        return jsonify({"ok": False, "error": str(e)}), 400
+        return err(str(e), 400)
     except Exception as e:
-        return jsonify({"ok": False, "error": f"Generation failed: {str(e)}"}), 500
-    finally:
-        RUN_LOCK.release()
+        return err(f"Generation failed: {str(e)}", 500)
+
+# parsed favorites as ((path, stat_key), list); the list is shared, never mutate it
+_FAV_CACHE = {"key": None, "data": []}
+_FAV_LOCK = threading.Lock()
+
+def favorites_source() -> tuple:
+    """(path, stat_key) to read favorites from.
+
+    favorites.json is always written and stays the reference. favorites.msgpack
+    is read instead when ormsgpack is installed and the mirror is not older, so
+    a save made from an interpreter without ormsgpack is never shadowed."""
+    try:
+        json_key = stat_key(FAVORITES_FILE)
+    except FileNotFoundError:
+        json_key = None
+    if ormsgpack is not None:
+        try:
+            pack_key = stat_key(FAVORITES_PACK)
+        except FileNotFoundError:
+            pack_key = None
+        if pack_key is not None and (json_key is None or pack_key[0] >= json_key[0]):
+            return FAVORITES_PACK, pack_key
+    if json_key is None:
+        raise FileNotFoundError(str(FAVORITES_FILE))
+    return FAVORITES_FILE, json_key
+
+def load_favorites() -> list:
+    """Favorites list, re-parsed only when the file it comes from changed on disk."""
+    path, key = favorites_source()
+    with _FAV_LOCK:
+        if _FAV_CACHE["key"] != (path, key):
+            raw = path.read_bytes()
+            _FAV_CACHE["data"] = ormsgpack.unpackb(raw) if path == FAVORITES_PACK else json_loads(raw)
+            _FAV_CACHE["key"] = (path, key)
+        return _FAV_CACHE["data"]
+
+def save_favorites(favorites: list):
+    with _FAV_LOCK:
+        # JSON first: the mirror must end up at least as new to be preferred
+        atomic_write_json(FAVORITES_FILE, favorites)
+        path = FAVORITES_FILE
+        if ormsgpack is not None:
+            atomic_write_bytes(FAVORITES_PACK, ormsgpack.packb(favorites))
+            path = FAVORITES_PACK
+        _FAV_CACHE["key"], _FAV_CACHE["data"] = (path, stat_key(path)), favorites
 
 @app.route("/api/favorites", methods=["GET", "POST"])
 def api_favorites():
     if request.method == "GET":
         # Charger les favoris
-        if FAVORITES_FILE.exists():
+        try:
+            # weak ETag from the source file's stat: an unchanged list costs a 304
             try:
-                favorites = json.loads(FAVORITES_FILE.read_text(encoding="utf-8"))
-                return jsonify({"favorites": favorites})
-            except Exception:
-                pass
-        return jsonify({"favorites": []})
+                etag = "%x-%x" % favorites_source()[1]
+            except FileNotFoundError:
+                etag = None
+            if etag and request.if_none_match.contains_weak(etag):
+                resp = Response(status=304)
+            else:
+                resp = json_response({"favorites": load_favorites()})
+            if etag:
+                resp.set_etag(etag, weak=True)
+                resp.headers["Cache-Control"] = "no-cache"  # always revalidate
+            return resp
+        except Exception:
+            # missing (FileNotFoundError) or unreadable file
+            return json_response({"favorites": []})
     
     elif request.method == "POST":
         # Sauvegarder les favoris
@@ -879,37 +1632,53 @@ def api_favorites():
         favorites = data.get("favorites", [])
         
         try:
-            FAVORITES_FILE.write_text(json.dumps(favorites, indent=2), encoding="utf-8")
-            return jsonify({"ok": True})
+            save_favorites(favorites)
+            return json_response({"ok": True})
         except Exception as e:
-            return jsonify({"ok": False, "error": str(e)}), 500
+            return err(str(e), 500)
 
 @app.route("/api/favorites/<favorite_id>", methods=["DELETE"])
 def api_delete_favorite(favorite_id):
-    if FAVORITES_FILE.exists():
-        try:
-            favorites = json.loads(FAVORITES_FILE.read_text(encoding="utf-8"))
-            favorites = [f for f in favorites if f.get("id") != favorite_id]
-            FAVORITES_FILE.write_text(json.dumps(favorites, indent=2), encoding="utf-8")
-            return jsonify({"ok": True})
-        except Exception as e:
-            return jsonify({"ok": False, "error": str(e)}), 500
-    
-    return jsonify({"ok": False, "error": "Favorites file not found"}), 404
+    try:
+        favorites = load_favorites()
+    except FileNotFoundError:
+        return err("Favorites file not found", 404)
+    except Exception as e:
+        return err(str(e), 500)
+    kept = [f for f in favorites if f.get("id") != favorite_id]
+    if len(kept) == len(favorites):
+        return err("Favorite not found", 404)
+    try:
+        save_favorites(kept)
+        return json_response({"ok": True})
+    except Exception as e:
+        return err(str(e), 500)
 
 # ---- Index and run ----
 
+MODELS_TTL = 5.0
+# (monotonic time of the last check, (diff_root, models), encoded body)
+_MODELS_RESP = (0.0, None, b"")
+
 @app.route("/api/models", methods=["GET"])
 def api_models():
+    global _MODELS_RESP
     try:
-        cfg = load_config()
-        root = resolve_diff_root(cfg)
-        models = discover_models(root)
-        resp = [{'repo_id': repo, 'label': repo.split('/')[-1].replace('_', '.') } for repo in models]
-        return jsonify({'ok': True, 'models': resp, 'diff_root': str(root)})
+        checked, key, body = _MODELS_RESP
+        now = time.monotonic()
+        if key is None or now - checked > MODELS_TTL:
+            cfg = load_config()
+            root = resolve_diff_root(cfg)
+            models = discover_models(root)
+            if (str(root), models) != key:
+                resp = [{'repo_id': repo, 'label': repo.split('/')[-1].replace('_', '.') } for repo in models]
+                body = json_response({'ok': True, 'models': resp, 'diff_root': str(root)}).get_data()
+                key = (str(root), models)
+            _MODELS_RESP = (now, key, body)
+        return Response(body, mimetype="application/json")
     except Exception as e:
         # Return explicit error so frontend can fallback gracefully
-        return jsonify({'ok': False, 'error': str(e)}), 500
+        return err(str(e), 500)
 
 if __name__ == "__main__":
     print("DiffRhythm GUI starting...")
@@ -917,4 +1686,11 @@ if __name__ == "__main__":
     print(f"DiffRhythm root: {DIFF_ROOT}")
     if not INFER_SCRIPT.exists():
         print("ERROR: infer.py not found. Check that gui/ is next to the project root.")
-    app.run(host="0.0.0.0", port=7860, debug=False)
+    if waitress_serve is not None:
+        # generations are capped at SERVER_THREADS - UI_RESERVED_THREADS (see
+        # run_infer), so a few threads stay free for the UI while jobs wait
+        waitress_serve(app, host="0.0.0.0", port=7860,
+                       threads=SERVER_THREADS,
+                       channel_timeout=600)
+    else:
+        app.run(host="0.0.0.0", port=7860, debug=False, threaded=True)
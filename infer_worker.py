@@ -0,0 +1,116 @@
+"""Long-lived DiffRhythm inference worker.
+
+Started by app.py as ``python -u infer_worker.py <diff_root> <infer_script>``.
+It reads one JSON job per line on stdin and answers with one JSON line per
+job on the protocol channel (the original stdout):
+
+    in:  {"job_id": "...", "argv": ["--output-dir", "...", ...]}
+    out: {"job_id": "...", "returncode": 0, "logs": "..."}
+
+Each job re-runs the ``__main__`` block of infer/infer.py in this process, so
+torch, CUDA init and the other heavy imports are paid once per worker instead
+of once per generation. ``infer_utils.prepare_model`` is memoized as well so
+the weights stay resident between jobs using the same model.
+"""
+import os
+import sys
+import json
+import runpy
+import tempfile
+import traceback
+
+
+def open_protocol_channel():
+    # Keep the real stdout for protocol messages only and point fd 1 at stderr,
+    # so stray C-level prints (CUDA, ffmpeg, ...) cannot corrupt the stream.
+    proto_fd = os.dup(1)
+    os.dup2(2, 1)
+    return os.fdopen(proto_fd, "w", buffering=1, encoding="utf-8")
+
+
+def memoize_prepare_model():
+    """Keep the last loaded model set around instead of reloading it per job."""
+    try:
+        import infer_utils
+    except Exception:
+        return
+    original = getattr(infer_utils, "prepare_model", None)
+    if original is None:
+        return
+
+    state = {"key": None, "value": None}
+
+    def prepare_model(*args, **kwargs):
+        key = repr((args, sorted(kwargs.items())))
+        if state["key"] != key:
+            # drop the previous weights first: only one model fits on most GPUs
+            state["key"], state["value"] = None, None
+            state["value"] = original(*args, **kwargs)
+            state["key"] = key
+        return state["value"]
+
+    infer_utils.prepare_model = prepare_model
+
+
+def run_job(infer_script: str, argv: list):
+    # Point fds 1 and 2 at a per-job file rather than swapping sys.stdout: that
+    # also catches what bypasses Python (CUDA/C++ warnings, ffmpeg, writes to
+    # sys.__stderr__), in the order it was written, like the old subprocess pipe.
+    code = 0
+    sys.argv = [infer_script] + [str(a) for a in argv]
+    with tempfile.TemporaryFile() as log:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        saved = os.dup(1), os.dup(2)
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        try:
+            runpy.run_path(infer_script, run_name="__main__")
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                code = e.code
+            elif e.code is not None:
+                print(e.code)
+                code = 1
+        except Exception:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            os.close(saved[0])
+            os.close(saved[1])
+        log.seek(0)
+        logs = log.read().decode("utf-8", "replace")
+    return code, logs
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("usage: infer_worker.py <diff_root> <infer_script>", file=sys.stderr)
+        return 2
+    diff_root, infer_script = sys.argv[1], sys.argv[2]
+    proto = open_protocol_channel()
+
+    # same import layout as `python infer/infer.py` run from diff_root
+    sys.path.insert(0, os.path.dirname(os.path.abspath(infer_script)))
+    sys.path.insert(1, diff_root)
+    memoize_prepare_model()
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            msg = json.loads(line)
+        except ValueError:
+            continue
+        code, logs = run_job(infer_script, msg.get("argv") or [])
+        proto.write(json.dumps({"job_id": msg.get("job_id"), "returncode": code, "logs": logs}) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())